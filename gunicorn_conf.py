@@ -0,0 +1,17 @@
+"""
+Gunicorn configuration for the PDF generation server.
+
+Usage:
+    gunicorn -c gunicorn_conf.py server:app
+"""
+
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+
+# PDF generation is CPU-bound in ReportLab, so scale with processes, not threads
+workers = int(os.environ.get("GUNICORN_WORKERS", os.cpu_count() or 1))
+worker_class = "sync"
+
+# Import the app once in the master so module-level state is shared copy-on-write
+preload_app = True
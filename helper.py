@@ -4,15 +4,17 @@ Generates PDF reports in Texas Real Estate Commission format.
 """
 
 import os
+import io
 import html
 import json
+from functools import lru_cache, partial
 from typing import List, Dict, Optional, Any
 from datetime import datetime
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import inch
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_RIGHT, TA_JUSTIFY
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, KeepTogether, Frame, PageTemplate, Flowable
+from reportlab.platypus import BaseDocTemplate, Paragraph, Spacer, PageBreak, KeepTogether, Frame, PageTemplate, Flowable
 from reportlab.pdfgen import canvas
 from reportlab.lib.colors import black
 from pdfrw import PdfReader, PdfWriter, PdfDict
@@ -22,6 +24,36 @@ from pypdf import PdfReader as PyPdfReader, PdfWriter as PyPdfWriter
 class TRECReportCanvas(canvas.Canvas):
     """Custom canvas for TREC report with headers and footers."""
     
+    # Header layout (precomputed once instead of on every page)
+    _HDR_Y1 = 10.5 * inch  # Report ID baseline
+    _HDR_Y2 = 10.4 * inch  # Separator line
+    _HDR_LINE = (0.5 * inch, _HDR_Y2, 8 * inch, _HDR_Y2)
+    _LEGEND_Y = 10.25 * inch
+    _COL_XS = tuple(0.5 * inch + i * 1.75 * inch for i in range(4))
+    _COL_LABELS = ("I=Inspected", "NI=Not Inspected", "NP=Not Present", "D=Deficient")
+    _LEGEND = tuple(zip(_COL_XS, _COL_LABELS))
+    _BOX_LABEL_Y = 10.05 * inch
+    _BOX_RECT = (0.45 * inch, 10.0 * inch, 7.5 * inch, 0.15 * inch)
+    _BOX_LABELS = tuple((0.5 * inch + dx * inch, lbl)
+                        for dx, lbl in ((0.15, "I"), (0.4, "NI"), (0.7, "NP"), (1.0, "D")))
+    
+    # Footer layout
+    _FOOTER_CENTER_X = 4.25 * inch
+    _FOOTER_PAGE_Y = 0.6 * inch
+    _FOOTER_REI_POS = (0.5 * inch, 0.4 * inch)
+    _FOOTER_REI = "REI 7-6 (8/9/21)"
+    _FOOTER_TREC_Y = 0.25 * inch
+    _FOOTER_TREC = "Promulgated by the Texas Real Estate Commission - (512) 936-3000 - www.trec.texas.gov"
+    
+    # Per-page canvas fields needed to replay a deferred page in save().
+    # Everything else (fonts, outlines, document state) is shared across pages.
+    _PAGE_STATE_ATTRS = (
+        '_pageNumber', '_pagesize', '_pageRotation', '_preamble',
+        '_code', '_psCommandsBeforePage', '_psCommandsAfterPage',
+        '_currentPageHasImages', '_formsinuse', '_annotationrefs',
+        '_formData', '_colorsUsed', '_shadingUsed', '_extgstate',
+    )
+    
     def __init__(self, *args, **kwargs):
         self.report_id = kwargs.pop('report_id', '')
         self.checkbox_data = kwargs.pop('checkbox_data', {})
@@ -30,14 +62,14 @@ class TRECReportCanvas(canvas.Canvas):
         self._saved_page_states = []
 
     def showPage(self):
-        self._saved_page_states.append(dict(self.__dict__))
+        d = self.__dict__
+        self._saved_page_states.append({name: d[name] for name in self._PAGE_STATE_ATTRS})
         self._startPage()
 
     def save(self):
         num_pages = len(self._saved_page_states)
         for state in self._saved_page_states:
             self.__dict__.update(state)
-            self.draw_header()
             self.draw_footer(num_pages)
             canvas.Canvas.showPage(self)
         canvas.Canvas.save(self)
@@ -48,46 +80,25 @@ class TRECReportCanvas(canvas.Canvas):
         
         # Report ID - LEFT aligned at top
         self.setFont("Times-Roman", 10)
-        self.drawString(0.5 * inch, 10.5 * inch, f"Report Identification: {self.report_id}")
+        self.drawString(self._COL_XS[0], self._HDR_Y1, f"Report Identification: {self.report_id}")
         
         # Draw a line under report ID (full width within margins)
-        self.line(0.5 * inch, 10.4 * inch, 8 * inch, 10.4 * inch)
+        self.line(*self._HDR_LINE)
         
         # Column headers - spread across the page width
-        y_pos = 10.25 * inch
         self.setFont("Times-Bold", 10)
-        
-        # Calculate positions for 4 columns
-        col_width = 1.75 * inch
-        start_x = 0.5 * inch
-        
-        # I = Inspected
-        self.drawString(start_x, y_pos, "I=Inspected")
-        
-        # NI = Not Inspected
-        self.drawString(start_x + col_width, y_pos, "NI=Not Inspected")
-        
-        # NP = Not Present
-        self.drawString(start_x + (col_width * 2), y_pos, "NP=Not Present")
-        
-        # D = Deficient
-        self.drawString(start_x + (col_width * 3), y_pos, "D=Deficient")
-        
-        # Draw checkbox column headers
-        y_pos = 10.05 * inch
-        self.setFont("Times-Bold", 9)
-        checkbox_x = 0.5 * inch
+        y_pos = self._LEGEND_Y
+        for x, lbl in self._LEGEND:
+            self.drawString(x, y_pos, lbl)
         
         # Draw a box around the checkbox header area - FULL WIDTH within margins
-        box_width = 8 * inch - 0.5 * inch  # From left margin to right margin
-        self.rect(checkbox_x - 0.05 * inch, y_pos - 0.05 * inch, 
-                 box_width, 0.15 * inch, stroke=1, fill=0)
+        self.setFont("Times-Bold", 9)
+        self.rect(*self._BOX_RECT, stroke=1, fill=0)
         
         # Draw checkbox labels (centered in their sections)
-        self.drawCentredString(checkbox_x + 0.15 * inch, y_pos, "I")
-        self.drawCentredString(checkbox_x + 0.4 * inch, y_pos, "NI")
-        self.drawCentredString(checkbox_x + 0.7 * inch, y_pos, "NP")
-        self.drawCentredString(checkbox_x + 1.0 * inch, y_pos, "D")
+        y_pos = self._BOX_LABEL_Y
+        for x, lbl in self._BOX_LABELS:
+            self.drawCentredString(x, y_pos, lbl)
         
         self.restoreState()
 
@@ -98,21 +109,25 @@ class TRECReportCanvas(canvas.Canvas):
         # Page number - centered
         self.setFont("Times-Roman", 10)
         page_text = f"Page {self._pageNumber} of {num_pages}"
-        self.drawCentredString(4.25 * inch, 0.6 * inch, page_text)
+        self.drawCentredString(self._FOOTER_CENTER_X, self._FOOTER_PAGE_Y, page_text)
         
         # TREC reference - left aligned
         self.setFont("Times-Roman", 8)
-        self.drawString(0.5 * inch, 0.4 * inch, "REI 7-6 (8/9/21)")
+        self.drawString(*self._FOOTER_REI_POS, self._FOOTER_REI)
         
         # TREC info - centered
-        self.drawCentredString(4.25 * inch, 0.25 * inch, 
-                              "Promulgated by the Texas Real Estate Commission - (512) 936-3000 - www.trec.texas.gov")
+        self.drawCentredString(self._FOOTER_CENTER_X, self._FOOTER_TREC_Y, self._FOOTER_TREC)
         
         self.restoreState()
 
 
-def convert_to_roman(num: int) -> str:
-    """Convert integer to Roman numeral."""
+def _draw_page_header(canv: TRECReportCanvas, doc) -> None:
+    """PageTemplate onPage callback: draw the TREC header as each page starts."""
+    canv.draw_header()
+
+
+def _roman_numeral(num: int) -> str:
+    """Build a Roman numeral by repeated subtraction (uncached)."""
     val = [
         1000, 900, 500, 400,
         100, 90, 50, 40,
@@ -135,25 +150,64 @@ def convert_to_roman(num: int) -> str:
     return roman_num
 
 
+# Lookup tables for the common cases (section numbers and line item letters)
+_ROMAN_SMALL = tuple(_roman_numeral(n) for n in range(51))
+_LETTERS = tuple(chr(65 + i) for i in range(26))  # 65 is ASCII for 'A'
+
+
+@lru_cache(maxsize=512)
+def convert_to_roman(num: int) -> str:
+    """Convert integer to Roman numeral."""
+    if 0 <= num < 51:
+        return _ROMAN_SMALL[num]
+    return _roman_numeral(num)
+
+
+@lru_cache(maxsize=4096)
 def convert_to_letter(num: int) -> str:
     """Convert integer to letter (0->A, 1->B, etc.)."""
     if num < 0:
         return ""
     if num < 26:
-        return chr(65 + num)  # 65 is ASCII for 'A'
+        return _LETTERS[num]
     # For numbers > 25, use AA, AB, etc.
-    return convert_to_letter(num // 26 - 1) + chr(65 + (num % 26))
+    return convert_to_letter(num // 26 - 1) + _LETTERS[num % 26]
+
+
+# Entities that realistically show up in comment text. '&amp;' must stay last
+# so that double-escaped input like '&amp;lt;' decodes to '&lt;', not '<'.
+_FAST_ENTITIES = (
+    ('&lt;', '<'),
+    ('&gt;', '>'),
+    ('&quot;', '"'),
+    ('&apos;', "'"),
+    ('&#39;', "'"),
+    ('&amp;', '&'),
+)
 
 
 def escape_html_entities(text: str) -> str:
     """Convert HTML entities to normal characters."""
     if not text:
         return ""
-    # Use html.unescape to handle all HTML entities
-    text = html.unescape(text)
+    if '&' not in text:
+        return text
+    # Fast path when every '&' starts one of the common entities
+    counts = [text.count(entity) for entity, _ in _FAST_ENTITIES]
+    if sum(counts) != text.count('&'):
+        # Use html.unescape to handle all other HTML entities
+        return html.unescape(text)
+    for (entity, char), count in zip(_FAST_ENTITIES, counts):
+        if count:
+            text = text.replace(entity, char)
     return text
 
 
+def _order_key(item: Dict[str, Any], _get=dict.get) -> Any:
+    """Sort key for sections, line items and comments."""
+    return _get(item, 'order', 0)
+
+
 def get_comment_text(comment: Dict[str, Any]) -> str:
     """Extract comment text from various possible fields."""
     for field in ['text', 'content', 'commentText', 'value']:
@@ -162,32 +216,54 @@ def get_comment_text(comment: Dict[str, Any]) -> str:
     return ""
 
 
+def _comment_paragraph_text(comment: Dict[str, Any]) -> str:
+    """Comment text unescaped and with line breaks converted, ready for a Paragraph."""
+    comment_text = get_comment_text(comment)
+    if '\n' in comment_text:
+        comment_text = comment_text.replace('\n', '<br/>')
+    return comment_text
+
+
+# Inspection statuses accepted from line item data
+_VALID_STATUS = frozenset(('I', 'NI', 'NP', 'D'))
+
+
 def get_inspection_status(line_item: Dict[str, Any]) -> str:
     """Determine inspection status from line item data."""
     # First check explicit inspection status
-    if line_item.get('inspectionStatus'):
-        status = line_item['inspectionStatus'].upper()
-        if status in ['I', 'NI', 'NP', 'D']:
+    status = line_item.get('inspectionStatus')
+    if status:
+        status = status.upper()
+        if status in _VALID_STATUS:
             return status
     
     # Check isDeficient flag
     if line_item.get('isDeficient'):
         return 'D'
     
-    # Check if there are deficient comments
-    comments = line_item.get('comments', [])
-    for comment in comments:
+    # Check if there are deficient comments (single pass)
+    has_comments = False
+    for comment in line_item.get('comments') or ():
+        has_comments = True
         if comment.get('type') == 'deficient' or comment.get('isFlagged'):
             return 'D'
     
     # Default to Inspected if there are comments
-    if comments:
-        return 'I'
-    
-    return ''
+    return 'I' if has_comments else ''
+
+
+_STYLES_SINGLETON = None
 
 
 def create_styles():
+    """Return the custom paragraph styles for the report (built once, then shared)."""
+    global _STYLES_SINGLETON
+    if _STYLES_SINGLETON is None:
+        _STYLES_SINGLETON = _build_styles()
+    return _STYLES_SINGLETON
+
+
+def _build_styles():
     """Create custom paragraph styles for the report."""
     styles = getSampleStyleSheet()
     
@@ -270,34 +346,48 @@ def create_styles():
 class CheckboxMarker(Flowable):
     """Flowable that draws checkboxes immediately when rendered."""
     
+    # Checkbox geometry (relative to the flowable origin)
+    _CHECKBOX_SIZE = 10
+    _CHECKBOX_X = -1.25 * inch  # Offset to the left (in the margin area)
+    _SPACING = 0.25 * inch
+    _Y_BASE = 3  # Baseline adjustment
+    
+    # One prebuilt path per status, shared by every marker
+    _PATHS: Dict[str, Any] = {}
+    
     def __init__(self, status: str):
         Flowable.__init__(self)
-        self.status = status
+        self.status = status.upper() if status else ''
         self.width = 1.25 * inch  # Width of checkbox column
         self.height = 13  # Height to align with line item text
     
+    @classmethod
+    def _get_path(cls, canv, status: str):
+        """Return the cached path (4 squares plus the X for status)."""
+        path = cls._PATHS.get(status)
+        if path is None:
+            size = cls._CHECKBOX_SIZE
+            y = cls._Y_BASE
+            path = canv.beginPath()
+            for i, stat in enumerate(('I', 'NI', 'NP', 'D')):
+                x = cls._CHECKBOX_X + (i * cls._SPACING)
+                
+                # Checkbox square
+                path.rect(x, y, size, size)
+                
+                # Draw an X inside the box if this is the selected status
+                if stat == status:
+                    path.moveTo(x, y)
+                    path.lineTo(x + size, y + size)
+                    path.moveTo(x + size, y)
+                    path.lineTo(x, y + size)
+            cls._PATHS[status] = path
+        return path
+    
     def draw(self):
         """Draw checkboxes at the current position."""
         canvas = self.canv
-        
-        # Draw checkboxes immediately at current position
-        checkbox_size = 10
-        checkbox_x = -1.25 * inch  # Offset to the left (in the margin area)
-        spacing = 0.25 * inch
-        y_base = 3  # Baseline adjustment
-        
-        statuses = ['I', 'NI', 'NP', 'D']
-        for i, stat in enumerate(statuses):
-            x = checkbox_x + (i * spacing)
-            
-            # Draw checkbox square
-            canvas.rect(x, y_base, checkbox_size, checkbox_size, stroke=1, fill=0)
-            
-            # Fill if this is the selected status
-            if self.status and stat == self.status.upper():
-                # Draw an X inside the box
-                canvas.line(x, y_base, x + checkbox_size, y_base + checkbox_size)
-                canvas.line(x + checkbox_size, y_base, x, y_base + checkbox_size)
+        canvas.drawPath(self._get_path(canvas, self.status), stroke=1, fill=0)
 
 
 class CheckboxDrawer:
@@ -352,27 +442,22 @@ def generate_trec_pdf(sections: List[Dict], metadata: Dict, output_path: str) ->
     
     # Ensure output directory exists
     output_dir = os.path.dirname(output_path)
-    if output_dir and not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
     
     # Sort sections by order
-    sorted_sections = sorted(sections, key=lambda x: x.get('order', 0))
+    sorted_sections = sorted(sections, key=_order_key)
     
     # Extract report ID
     report_id = metadata.get('reportId', metadata.get('report_id', 'N/A'))
     
-    # Create PDF document
-    doc = SimpleDocTemplate(
-        output_path,
-        pagesize=letter,
-        topMargin=1.25 * inch,
-        bottomMargin=0.75 * inch,
-        leftMargin=1.75 * inch,  # Leave space for checkboxes
-        rightMargin=0.75 * inch
-    )
-    
-    # Create styles
+    # Create styles (resolved once, outside the loops)
     styles = create_styles()
+    section_style = styles['SectionHeader']
+    line_item_style = styles['LineItemHeader']
+    comment_label_style = styles['CommentLabel']
+    comment_text_style = styles['CommentText']
+    media_style = styles['MediaReference']
     
     # Build story (list of flowables)
     story = []
@@ -391,11 +476,11 @@ def generate_trec_pdf(sections: List[Dict], metadata: Dict, output_path: str) ->
         # Section header
         section_name = section.get('name', '').upper()
         section_header = f"{section_num}. {section_name}"
-        story.append(Paragraph(section_header, styles['SectionHeader']))
+        story.append(Paragraph(section_header, section_style))
         
         # Sort and process line items
         line_items = section.get('lineItems', [])
-        sorted_line_items = sorted(line_items, key=lambda x: x.get('order', 0))
+        sorted_line_items = sorted(line_items, key=_order_key)
         
         for item_idx, line_item in enumerate(sorted_line_items):
             # Line item letter
@@ -415,11 +500,11 @@ def generate_trec_pdf(sections: List[Dict], metadata: Dict, output_path: str) ->
             line_item_content.append(CheckboxMarker(status))
             
             # Add line item header
-            line_item_content.append(Paragraph(line_item_header, styles['LineItemHeader']))
+            line_item_content.append(Paragraph(line_item_header, line_item_style))
             
             # Process comments
             comments = line_item.get('comments', [])
-            sorted_comments = sorted(comments, key=lambda x: x.get('order', 0))
+            sorted_comments = sorted(comments, key=_order_key)
             
             for comment in sorted_comments:
                 # Comment label
@@ -428,14 +513,12 @@ def generate_trec_pdf(sections: List[Dict], metadata: Dict, output_path: str) ->
                 
                 if comment_label:
                     label_text = f"{comment_number}. {comment_label}" if comment_number else comment_label
-                    line_item_content.append(Paragraph(label_text, styles['CommentLabel']))
+                    line_item_content.append(Paragraph(label_text, comment_label_style))
                 
                 # Comment text
-                comment_text = get_comment_text(comment)
+                comment_text = _comment_paragraph_text(comment)
                 if comment_text:
-                    # Handle line breaks
-                    comment_text = comment_text.replace('\n', '<br/>')
-                    line_item_content.append(Paragraph(comment_text, styles['CommentText']))
+                    line_item_content.append(Paragraph(comment_text, comment_text_style))
                 
                 # Media references
                 photos = comment.get('photos', [])
@@ -444,7 +527,7 @@ def generate_trec_pdf(sections: List[Dict], metadata: Dict, output_path: str) ->
                 
                 if total_media > 0:
                     media_text = f"See attached media ({total_media} item{'s' if total_media > 1 else ''})"
-                    line_item_content.append(Paragraph(media_text, styles['MediaReference']))
+                    line_item_content.append(Paragraph(media_text, media_style))
             
             # Add spacing between line items
             line_item_content.append(Spacer(1, 0.1 * inch))
@@ -460,14 +543,27 @@ def generate_trec_pdf(sections: List[Dict], metadata: Dict, output_path: str) ->
         story.append(Spacer(1, 0.2 * inch))
     
     # Build the PDF with custom canvas
-    def create_canvas(filename, **kwargs):
-        return TRECReportCanvas(
-            filename,
-            report_id=report_id,
-            checkbox_data=checkbox_positions,
-            **kwargs
-        )
+    create_canvas = partial(
+        TRECReportCanvas,
+        report_id=report_id,
+        checkbox_data=checkbox_positions
+    )
     
+    # Create PDF document
+    doc = BaseDocTemplate(
+        output_path,
+        pagesize=letter,
+        topMargin=1.25 * inch,
+        bottomMargin=0.75 * inch,
+        leftMargin=1.75 * inch,  # Leave space for checkboxes
+        rightMargin=0.75 * inch
+    )
+    # Header is drawn as each page begins; footer needs the page count and is drawn on save
+    doc.addPageTemplates([PageTemplate(
+        id='trec',
+        frames=[Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height, id='normal')],
+        onPage=_draw_page_header
+    )])
     doc.build(story, canvasmaker=create_canvas)
     
     # Now we need to add checkboxes - this requires a second pass
@@ -506,6 +602,19 @@ def generate_trec_pdf_from_json(json_data: Dict, output_path: str, metadata: Dic
     return generate_trec_pdf(sections, metadata, output_path)
 
 
+@lru_cache(maxsize=8)
+def _load_template_bytes(path: str, mtime: float) -> bytes:
+    """Read a template PDF from disk, cached per (path, mtime)."""
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@lru_cache(maxsize=8)
+def _load_pdf_reader(path: str, mtime: float) -> PyPdfReader:
+    """Parse a read-only input PDF with pypdf, cached per (path, mtime)."""
+    return PyPdfReader(io.BytesIO(_load_template_bytes(path, mtime)))
+
+
 def fill_top_fields_from_json(json_path: str, template_path: str, output_path: str) -> str:
     """
     NEW FUNCTION: Fill the top fields of the TREC PDF template from JSON data.
@@ -547,8 +656,8 @@ def fill_top_fields_from_json(json_path: str, template_path: str, output_path: s
         else:
             inspection_date = datetime.now().strftime('%m/%d/%Y')
         
-        # Load PDF template
-        template = PdfReader(template_path)
+        # Load PDF template (parsed fresh each time since its fields are filled in place)
+        template = PdfReader(fdata=_load_template_bytes(template_path, os.path.getmtime(template_path)))
         writer = PdfWriter()
         
         # Dictionary to map exact field names from page 1 to our data
@@ -652,16 +761,15 @@ def merge_pdfs_custom(blank_template_pdf: str, filled_pdf: str, sections_pdf: st
         # Pages 2-4: From filled PDF (take pages numbered 2, 3, 4 which are indices 1, 2, 3)
         print(f"  Adding pages 2-4 from: {os.path.basename(filled_pdf)}")
         filled_pages_count = 0
-        with open(filled_pdf, 'rb') as f2:
-            reader2 = PyPdfReader(f2)
-            # Take pages 2, 3, 4 (0-indexed as 1, 2, 3) from filled PDF
-            start_idx = 1  # Page 2 (0-indexed)
-            end_idx = min(4, len(reader2.pages))  # Up to page 4 (0-indexed, so index 3)
-            filled_pages_count = end_idx - start_idx
-            for i in range(start_idx, end_idx):
-                merger.add_page(reader2.pages[i])
-            if filled_pages_count < 3:
-                print(f"  ⚠️  Warning: Filled PDF only has {len(reader2.pages)} page(s), added pages 2-{end_idx} ({filled_pages_count} pages)")
+        reader2 = _load_pdf_reader(filled_pdf, os.path.getmtime(filled_pdf))
+        # Take pages 2, 3, 4 (0-indexed as 1, 2, 3) from filled PDF
+        start_idx = 1  # Page 2 (0-indexed)
+        end_idx = min(4, len(reader2.pages))  # Up to page 4 (0-indexed, so index 3)
+        filled_pages_count = end_idx - start_idx
+        for i in range(start_idx, end_idx):
+            merger.add_page(reader2.pages[i])
+        if filled_pages_count < 3:
+            print(f"  ⚠️  Warning: Filled PDF only has {len(reader2.pages)} page(s), added pages 2-{end_idx} ({filled_pages_count} pages)")
         
         # Pages 5+: All pages from sections PDF
         print(f"  Adding all pages from: {os.path.basename(sections_pdf)}")
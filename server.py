@@ -1,8 +1,8 @@
 import os
-import uuid
-import io
-from typing import Dict, Any
-from flask import Flask, request, jsonify, send_from_directory, url_for, abort
+import secrets
+from typing import Dict, Any, Iterable, Iterator
+import orjson
+from flask import Flask, request, send_from_directory, url_for, abort
 
 try:
 	from reportlab.pdfgen import canvas
@@ -11,6 +11,9 @@ except Exception:
 	REPORTLAB_AVAILABLE = False
 
 app = Flask(__name__)
+# Let a reverse proxy (e.g. nginx) serve downloads via X-Sendfile. Without a proxy that
+# honors the header, files are streamed through wsgi.file_wrapper (sendfile(2) where supported).
+app.use_x_sendfile = os.environ.get("USE_X_SENDFILE", "").lower() in ("1", "true", "yes")
 
 # Directory to store generated PDF files
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -18,16 +21,14 @@ GENERATED_DIR = os.path.join(BASE_DIR, "generated_files")
 os.makedirs(GENERATED_DIR, exist_ok=True)
 
 
-def _save_pdf_bytes(pdf_bytes: bytes, filename: str) -> str:
-	"""Save bytes to a file in GENERATED_DIR and return absolute path."""
-	path = os.path.join(GENERATED_DIR, filename)
-	with open(path, "wb") as f:
-		f.write(pdf_bytes)
-	return path
+# Longest line (in characters) drawn on a placeholder page
+MAX_LINE_CHARS = 90
 
 
-def _render_pdf_text(text: str) -> bytes:
-	"""Render simple PDF in-memory using reportlab. Raises NotImplementedError if reportlab is not available.
+def _render_pdf_lines(lines: Iterable[str], path: str) -> str:
+	"""Render simple PDF of lines straight to path using reportlab and return path. Raises NotImplementedError if reportlab is not available.
+
+	Lines are drawn as given; callers keep them within MAX_LINE_CHARS.
 
 	This is a tiny helper to generate a placeholder PDF. Your project can replace or extend this
 	with richer PDF-generation logic in the helper functions below.
@@ -35,21 +36,27 @@ def _render_pdf_text(text: str) -> bytes:
 	if not REPORTLAB_AVAILABLE:
 		raise NotImplementedError("reportlab is required for PDF generation; please install it or replace this helper")
 
-	buf = io.BytesIO()
-	p = canvas.Canvas(buf)
+	p = canvas.Canvas(path)
 	p.setFont("Helvetica", 12)
 	# Simple layout: write text lines
 	y = 800
-	for line in text.splitlines():
-		p.drawString(40, y, line[:90])
+	for line in lines:
+		p.drawString(40, y, line)
 		y -= 16
 		if y < 40:
 			p.showPage()
 			y = 800
 	p.showPage()
 	p.save()
-	buf.seek(0)
-	return buf.read()
+	return path
+
+
+def _summary_lines(title: str, data: Dict[str, Any]) -> Iterator[str]:
+	"""Yield the placeholder summary lines for a JSON payload, each within MAX_LINE_CHARS."""
+	summary_lines = [title, "", "Input JSON keys:"]
+	summary_lines.extend(f"- {k}: {str(v)[:80]}" for k, v in data.items())
+	# Values may contain newlines; split the joined text so they become separate lines
+	yield from (line[:MAX_LINE_CHARS] for line in "\n".join(summary_lines).splitlines())
 
 
 def generate_trec_pdf(data: Dict[str, Any]) -> str:
@@ -60,15 +67,9 @@ def generate_trec_pdf(data: Dict[str, Any]) -> str:
 	Replace the internals of this function with your actual logic.
 	"""
 	# Simple placeholder behavior: create a short PDF summarizing the payload
-	summary_lines = ["TREC PDF placeholder"]
-	summary_lines.append("")
-	summary_lines.append("Input JSON keys:")
-	for k, v in data.items():
-		summary_lines.append(f"- {k}: {str(v)[:80]}")
-
-	pdf_bytes = _render_pdf_text("\n".join(summary_lines))
-	filename = f"trec_{uuid.uuid4().hex}.pdf"
-	return _save_pdf_bytes(pdf_bytes, filename)
+	filename = f"trec_{secrets.token_hex(8)}.pdf"
+	path = os.path.join(GENERATED_DIR, filename)
+	return _render_pdf_lines(_summary_lines("TREC PDF placeholder", data), path)
 
 
 def generate_binsr_pdf(data: Dict[str, Any]) -> str:
@@ -77,15 +78,22 @@ def generate_binsr_pdf(data: Dict[str, Any]) -> str:
 	Replace the internals of this function with your actual logic.
 	Returns absolute path to generated PDF file.
 	"""
-	summary_lines = ["BINSR PDF placeholder"]
-	summary_lines.append("")
-	summary_lines.append("Input JSON keys:")
-	for k, v in data.items():
-		summary_lines.append(f"- {k}: {str(v)[:80]}")
+	filename = f"binsr_{secrets.token_hex(8)}.pdf"
+	path = os.path.join(GENERATED_DIR, filename)
+	return _render_pdf_lines(_summary_lines("BINSR PDF placeholder", data), path)
+
+
+def _load_json_body():
+	"""Parse the request body as JSON with orjson. Returns None if it is missing or invalid."""
+	try:
+		return orjson.loads(request.get_data())
+	except orjson.JSONDecodeError:
+		return None
 
-	pdf_bytes = _render_pdf_text("\n".join(summary_lines))
-	filename = f"binsr_{uuid.uuid4().hex}.pdf"
-	return _save_pdf_bytes(pdf_bytes, filename)
+
+def _json_response(payload: Dict[str, Any]):
+	"""Serialize payload with orjson into a JSON response."""
+	return app.response_class(orjson.dumps(payload), mimetype="application/json")
 
 
 @app.route("/generate_trec", methods=["POST"])
@@ -94,19 +102,19 @@ def route_generate_trec():
 
 	Expects JSON body. Returns JSON containing the filepath and filename.
 	"""
-	data = request.get_json(force=True, silent=True)
+	data = _load_json_body()
 	if data is None:
-		return jsonify({"error": "Invalid or missing JSON body"}), 400
+		return _json_response({"error": "Invalid or missing JSON body"}), 400
 
 	try:
 		pdf_path = generate_trec_pdf(data)
 	except NotImplementedError as e:
-		return jsonify({"error": str(e)}), 501
+		return _json_response({"error": str(e)}), 501
 	except Exception as e:
-		return jsonify({"error": f"Generation failed: {e}"}), 500
+		return _json_response({"error": f"Generation failed: {e}"}), 500
 
 	filename = os.path.basename(pdf_path)
-	return jsonify({"filepath": pdf_path, "filename": filename}), 200
+	return _json_response({"filepath": pdf_path, "filename": filename}), 200
 
 
 @app.route("/generate_binsr_pdf", methods=["POST"])
@@ -115,22 +123,28 @@ def route_generate_binsr_pdf():
 
 	Expects JSON body. Returns JSON containing the filepath and filename.
 	"""
-	data = request.get_json(force=True, silent=True)
+	data = _load_json_body()
 	if data is None:
-		return jsonify({"error": "Invalid or missing JSON body"}), 400
+		return _json_response({"error": "Invalid or missing JSON body"}), 400
 
 	try:
 		pdf_path = generate_binsr_pdf(data)
 	except NotImplementedError as e:
-		return jsonify({"error": str(e)}), 501
+		return _json_response({"error": str(e)}), 501
 	except Exception as e:
-		return jsonify({"error": f"Generation failed: {e}"}), 500
+		return _json_response({"error": f"Generation failed: {e}"}), 500
 
 	filename = os.path.basename(pdf_path)
-	return jsonify({"filepath": pdf_path, "filename": filename}), 200
+	return _json_response({"filepath": pdf_path, "filename": filename}), 200
+
+
+@app.route("/download/<path:name>", methods=["GET"])
+def route_download(name: str):
+	"""Endpoint to download a previously generated PDF from GENERATED_DIR."""
+	return send_from_directory(GENERATED_DIR, name, as_attachment=True)
 
 
 if __name__ == "__main__":
-	# Run a dev server. Use a proper WSGI server for production.
+	# Run a dev server. Use a proper WSGI server for production: gunicorn -c gunicorn_conf.py server:app
 	app.run(host="0.0.0.0", port=5000, debug=True)
 